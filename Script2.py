@@ -1,84 +1,476 @@
-import configparser
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import glob
+import mmap
+import multiprocessing
 import os
+import re
+import struct
+
+try:
+    from zlib_ng import zlib_ng as zlib
+except ImportError:  # zlib-ng необязателен, API совпадает со стандартным zlib
+    import zlib
+
+try:
+    from _fastgit import parse_commit as _fast_parse_commit
+except ImportError:  # расширение не собрано, используется разбор на Python
+    _fast_parse_commit = None
+
+_PARENT_RE = re.compile(rb"(?m)^parent ([0-9a-f]{40})")
+# Чтение файлов и zlib отпускают GIL, поэтому потоков больше, чем ядер
+_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Узкие фронты (почти вся линейная история) дешевле прочитать без пула потоков
+_THREAD_MIN_FRONTIER = 16
+# Процессы окупают запуск и pickle только на очень широком фронте обхода
+_PROCESS_MIN_FRONTIER = 1024
+# Пул процессов создаётся при уже работающих потоках, поэтому fork() небезопасен
+_PROCESS_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+_IDX_V2_MAGIC = b"\xfftOc"
+_PACK_TYPE_NAMES = {1: b"commit", 2: b"tree", 3: b"blob", 4: b"tag"}
+_OFS_DELTA = 6
+_REF_DELTA = 7
+_GRAPH_NO_PARENT = 0x70000000
+_GRAPH_EXTRA_EDGES = 0x80000000
 
 def load_config(config_file):
     """Загрузка конфигурации из INI файла"""
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    return config['settings']
+    config = {}
+    with open(config_file, encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if "=" not in line or line.startswith(("#", ";", "[")):
+                continue
+            key, value = line.split("=", 1)
+            config[key.strip().lower()] = value.strip()
+    return config
+
+@functools.lru_cache(maxsize=None)
+def _objects_root(repo_path):
+    """Путь к каталогу объектов репозитория"""
+    return os.path.join(repo_path, ".git", "objects")
+
+
+def _mmap_file(path):
+    """Отображение файла в память только для чтения"""
+    with open(path, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+@functools.lru_cache(maxsize=None)
+def _pack_files(repo_path):
+    """Индексы (версии 2) и pack-файлы репозитория: список (fanout, idx, pack)"""
+    packs = []
+    for idx_path in sorted(glob.glob(os.path.join(_objects_root(repo_path), "pack", "*.idx"))):
+        # Пустые и недописанные файлы пропускаем, как и отсутствующий commit-graph
+        try:
+            idx = _mmap_file(idx_path)
+        except (FileNotFoundError, ValueError):
+            continue
+        if (len(idx) < 8 + 256 * 4 or idx[:4] != _IDX_V2_MAGIC
+                or struct.unpack(">I", idx[4:8])[0] != 2):
+            idx.close()
+            continue
+        try:
+            pack = _mmap_file(idx_path[:-len(".idx")] + ".pack")
+        except (FileNotFoundError, ValueError):
+            idx.close()
+            continue
+        fanout = struct.unpack(">256I", idx[8:8 + 256 * 4])
+        packs.append((fanout, idx, pack))
+    return packs
+
+
+def close_pack_files(repo_path):
+    """Закрытие отображённых в память pack-файлов репозитория и сброс их кэша"""
+    for _, idx, pack in _pack_files(repo_path):
+        idx.close()
+        pack.close()
+    _pack_files.cache_clear()
+
+
+def close_commit_graph(repo_path):
+    """Закрытие отображённого в память файла commit-graph и сброс его кэша"""
+    commit_graph_file = try_load_commit_graph(repo_path)
+    if commit_graph_file is not None:
+        commit_graph_file[1].close()
+    try_load_commit_graph.cache_clear()
+
+
+def _find_oid(table, table_offset, fanout, sha):
+    """Двоичный поиск 20-байтного хэша в отсортированной таблице: номер или None"""
+    lo = fanout[sha[0] - 1] if sha[0] else 0
+    hi = fanout[sha[0]]
+    while lo < hi:
+        mid = (lo + hi) // 2
+        position = table_offset + mid * 20
+        candidate = table[position:position + 20]
+        if candidate < sha:
+            lo = mid + 1
+        elif candidate > sha:
+            hi = mid
+        else:
+            return mid
+    return None
+
+
+def _find_packed_object(repo_path, object_hash):
+    """Поиск объекта в индексах pack-файлов: (pack, смещение) или None"""
+    try:
+        sha = bytes.fromhex(object_hash)
+    except ValueError:
+        return None
+    for fanout, idx, pack in _pack_files(repo_path):
+        index = _find_oid(idx, 8 + 256 * 4, fanout, sha)
+        if index is None:
+            continue
+        count = fanout[255]
+        offsets = 8 + 256 * 4 + count * 24
+        offset = struct.unpack(">I", idx[offsets + index * 4:offsets + index * 4 + 4])[0]
+        if offset & 0x80000000:
+            large = offsets + count * 4 + (offset & 0x7FFFFFFF) * 8
+            offset = struct.unpack(">Q", idx[large:large + 8])[0]
+        return pack, offset
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def try_load_commit_graph(repo_path):
+    """Загрузка файла commit-graph: (fanout, данные, OIDL, CDAT, EDGE) или None"""
+    path = os.path.join(_objects_root(repo_path), "info", "commit-graph")
+    try:
+        data = _mmap_file(path)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    # Повреждённый или недописанный файл не должен ломать обход: без него
+    # родители читаются из объектов, как и для неподдерживаемых pack-индексов
+    size = len(data)
+    if size < 8:
+        data.close()
+        return None
+    signature, version, hash_version, chunk_count, base_count = struct.unpack(">4sBBBB", data[:8])
+    if (signature != b"CGPH" or version != 1 or hash_version != 1 or base_count != 0
+            or 8 + (chunk_count + 1) * 12 > size):
+        data.close()
+        return None
+
+    chunks = {}
+    for i in range(chunk_count):
+        chunk_id, offset = struct.unpack(">4sQ", data[8 + i * 12:8 + i * 12 + 12])
+        chunks[chunk_id] = offset
+    if (not {b"OIDF", b"OIDL", b"CDAT"} <= chunks.keys()
+            or any(offset > size for offset in chunks.values())
+            or chunks[b"OIDF"] + 256 * 4 > size):
+        data.close()
+        return None
+
+    fanout = struct.unpack(">256I", data[chunks[b"OIDF"]:chunks[b"OIDF"] + 256 * 4])
+    count = fanout[255]
+    if chunks[b"OIDL"] + count * 20 > size or chunks[b"CDAT"] + count * 36 > size:
+        data.close()
+        return None
+    return fanout, data, chunks[b"OIDL"], chunks[b"CDAT"], chunks.get(b"EDGE")
+
+
+def parents_fast(repo_path, commit_hash):
+    """Родители коммита из commit-graph без чтения объекта или None, если его там нет"""
+    commit_graph_file = try_load_commit_graph(repo_path)
+    if commit_graph_file is None:
+        return None
+    fanout, data, oidl, cdat, edge = commit_graph_file
+    try:
+        index = _find_oid(data, oidl, fanout, bytes.fromhex(commit_hash))
+    except ValueError:
+        return None
+    if index is None:
+        return None
+
+    # Запись CDAT: хэш дерева (20 байт), два родителя, поколение и время
+    position = cdat + index * 36 + 20
+    first, second = struct.unpack(">II", data[position:position + 8])
+    positions = []
+    if first != _GRAPH_NO_PARENT:
+        positions.append(first)
+    if second & _GRAPH_EXTRA_EDGES:
+        # У коммита больше двух родителей: остальные перечислены в EDGE
+        if edge is None:
+            return None
+        edge_position = edge + (second & ~_GRAPH_EXTRA_EDGES) * 4
+        while True:
+            if edge_position + 4 > len(data):
+                return None
+            value = struct.unpack(">I", data[edge_position:edge_position + 4])[0]
+            positions.append(value & ~_GRAPH_EXTRA_EDGES)
+            if value & _GRAPH_EXTRA_EDGES:
+                break
+            edge_position += 4
+    elif second != _GRAPH_NO_PARENT:
+        positions.append(second)
+    if any(parent >= fanout[255] for parent in positions):
+        return None
+
+    return [data[oidl + parent * 20:oidl + parent * 20 + 20].hex() for parent in positions]
+
+
+def _inflate_at(pack, position, size):
+    """Распаковка zlib-потока pack-файла, начинающегося с позиции position"""
+    decompressor = zlib.decompressobj()
+    chunks = []
+    chunk_size = max(size, 64)
+    while not decompressor.eof and position < len(pack):
+        chunks.append(decompressor.decompress(pack[position:position + chunk_size]))
+        position += chunk_size
+    return b"".join(chunks)
+
 
+def _read_varint(data, position):
+    """Чтение размера в формате дельты Git"""
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, position
+
+
+def _apply_delta(base, delta):
+    """Восстановление объекта по базовому объекту и дельте"""
+    _, position = _read_varint(delta, 0)
+    _, position = _read_varint(delta, position)
+    result = []
+    while position < len(delta):
+        opcode = delta[position]
+        position += 1
+        if opcode & 0x80:
+            offset = size = 0
+            for bit in range(4):
+                if opcode & (1 << bit):
+                    offset |= delta[position] << (8 * bit)
+                    position += 1
+            for bit in range(3):
+                if opcode & (0x10 << bit):
+                    size |= delta[position] << (8 * bit)
+                    position += 1
+            result.append(base[offset:offset + (size or 0x10000)])
+        elif opcode:
+            result.append(delta[position:position + opcode])
+            position += opcode
+        else:
+            raise ValueError("Invalid delta opcode 0")
+    return b"".join(result)
+
+
+def _read_pack_entry(repo_path, pack, offset):
+    """Чтение объекта из pack-файла с раскрытием цепочки дельт: (тип, данные)"""
+    byte = pack[offset]
+    position = offset + 1
+    object_type = (byte >> 4) & 0x07
+    size = byte & 0x0F
+    shift = 4
+    while byte & 0x80:
+        byte = pack[position]
+        position += 1
+        size |= (byte & 0x7F) << shift
+        shift += 7
+
+    if object_type == _OFS_DELTA:
+        byte = pack[position]
+        position += 1
+        base_distance = byte & 0x7F
+        while byte & 0x80:
+            byte = pack[position]
+            position += 1
+            base_distance = ((base_distance + 1) << 7) | (byte & 0x7F)
+        base_type, base = _read_pack_entry(repo_path, pack, offset - base_distance)
+        return base_type, _apply_delta(base, _inflate_at(pack, position, size))
+
+    if object_type == _REF_DELTA:
+        base_hash = pack[position:position + 20].hex()
+        base_object = read_git_object(repo_path, base_hash)
+        type_name, _, base = base_object.partition(b" ")
+        base = base[base.find(b"\x00") + 1:]
+        return type_name, _apply_delta(base, _inflate_at(pack, position + 20, size))
+
+    return _PACK_TYPE_NAMES[object_type], _inflate_at(pack, position, size)
+
+
+def _read_packed_object(repo_path, object_hash):
+    """Чтение объекта из pack-файлов в формате распакованного loose-объекта"""
+    location = _find_packed_object(repo_path, object_hash)
+    if location is None:
+        raise FileNotFoundError(f"Git object {object_hash} not found")
+    object_type, data = _read_pack_entry(repo_path, *location)
+    return b"%s %d\x00%s" % (object_type, len(data), data)
+
+
+@functools.lru_cache(maxsize=None)
 def read_git_object(repo_path, object_hash):
     """Чтение Git-объекта по его хэшу"""
-    object_dir = os.path.join(repo_path, ".git", "objects", object_hash[:2])
-    object_file = os.path.join(object_dir, object_hash[2:])
+    object_file = f"{_objects_root(repo_path)}{os.sep}{object_hash[:2]}{os.sep}{object_hash[2:]}"
 
-    if not os.path.exists(object_file):
-        raise FileNotFoundError(f"Git object {object_hash} not found")
+    try:
+        fd = os.open(object_file, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    except FileNotFoundError:
+        # После git gc объекты лежат не отдельными файлами, а в pack-файлах
+        return _read_packed_object(repo_path, object_hash)
+    try:
+        compressed_data = os.read(fd, os.fstat(fd).st_size)
+    finally:
+        os.close(fd)
 
-    with open(object_file, "rb") as file:
-        compressed_data = file.read()
+    # Модуль zlib не умеет сбрасывать состояние inflate для повторного
+    # использования, поэтому достаточно одного вызова без промежуточного объекта
+    return zlib.decompress(compressed_data)
 
-    import zlib
-    decompressed_data = zlib.decompress(compressed_data)
-    return decompressed_data.decode("utf-8")
+
+def _find_parents(data, start, end):
+    """Поиск хэшей родителей в заголовке коммита между позициями start и end"""
+    return tuple(parent.decode("ascii") for parent in _PARENT_RE.findall(data, start, end))
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_commit(commit_data):
+    """Разбор содержимого объекта коммита на родителей и сообщение"""
+    if _fast_parse_commit is not None:
+        return _fast_parse_commit(commit_data)
+    return _parse_commit_py(commit_data)
+
+
+def _parse_commit_py(commit_data):
+    """Разбор объекта коммита на Python, когда расширение _fastgit не собрано"""
+    # Пропускаем заголовок объекта вида b"commit <size>\x00" без копирования данных
+    start = commit_data.find(b"\x00") + 1
+    header_end = commit_data.find(b"\n\n", start)
+    if header_end < 0:
+        header_end = len(commit_data)
+    # Родители идут сразу после tree, до author; подписи (gpgsig) дальше не сканируем
+    parents_end = commit_data.find(b"\nauthor ", start, header_end)
+    if parents_end < 0:
+        parents_end = header_end
+    message = commit_data[header_end + 2:]
+    return _find_parents(commit_data, start, parents_end), message.strip().decode("utf-8", "replace")
 
 
 def get_commit_data(repo_path, commit_hash):
     """Получение данных коммита из его объекта"""
-    commit_data = read_git_object(repo_path, commit_hash)
-    lines = commit_data.split("\n")
-    parents = []
-    message = ""
-    is_message = False
+    parents, message = _parse_commit(read_git_object(repo_path, commit_hash))
+    return list(parents), message
+
+
+def _inflate_and_parse(repo_path, shard):
+    """Чтение и разбор части коммитов в дочернем процессе"""
+    return [(commit_hash, *_parse_commit(read_git_object(repo_path, commit_hash)))
+            for commit_hash in shard]
+
+
+def _read_inline(repo_path, frontier):
+    """Чтение коммитов фронта обхода в текущем потоке, результаты в порядке frontier"""
+    return [get_commit_data(repo_path, commit) for commit in frontier]
 
-    for line in lines:
-        if is_message:
-            message += line + "\n"
-        elif line.startswith("parent "):
-            parents.append(line.split(" ")[1])
-        elif line == "":
-            is_message = True
 
-    return parents, message.strip()
+def _read_in_threads(repo_path, frontier, thread_pool):
+    """Чтение коммитов фронта обхода в потоках, результаты в порядке frontier"""
+    return list(thread_pool.map(lambda commit: get_commit_data(repo_path, commit), frontier))
 
 
-def get_commit_graph(repo_path, starting_commit_hash):
-    """Построение графа коммитов начиная с указанного хэша"""
+def _read_in_processes(repo_path, frontier, process_pool):
+    """Чтение коммитов фронта обхода в дочерних процессах, результаты в порядке frontier"""
+    shard_count = os.cpu_count() or 1
+    shards = [frontier[i::shard_count] for i in range(shard_count)]
+    futures = [process_pool.submit(_inflate_and_parse, repo_path, shard) for shard in shards if shard]
+    commits = {}
+    for future in futures:
+        for commit_hash, parents, message in future.result():
+            commits[commit_hash] = (list(parents), message)
+    return [commits[commit] for commit in frontier]
+
+
+def get_commit_graph(repo_path, starting_commit_hash, messages=None):
+    """Построение графа коммитов начиная с указанного хэша
+
+    Если передан словарь messages, в него записываются сообщения прочитанных
+    коммитов, чтобы generate_plantuml_graph не читал их повторно.
+    """
     commit_graph = {}
-    stack = [starting_commit_hash]
+    visited = {starting_commit_hash}
+    frontier = [starting_commit_hash]
+    process_pool = None
 
-    while stack:
-        current_commit = stack.pop()
-        if current_commit not in commit_graph:
-            parents, _ = get_commit_data(repo_path, current_commit)
-            commit_graph[current_commit] = parents
-            stack.extend(parents)
+    try:
+        with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as thread_pool:
+            while frontier:
+                # Коммиты из commit-graph не требуют чтения и распаковки объектов
+                known_parents = [parents_fast(repo_path, commit) for commit in frontier]
+                missing = [commit for commit, parents in zip(frontier, known_parents) if parents is None]
+                # Способ чтения выбирается для каждого фронта отдельно по его ширине
+                if len(missing) >= _PROCESS_MIN_FRONTIER:
+                    if process_pool is None:
+                        process_pool = ProcessPoolExecutor(
+                            mp_context=multiprocessing.get_context(_PROCESS_START_METHOD)
+                        )
+                    results = iter(_read_in_processes(repo_path, missing, process_pool))
+                elif len(missing) >= _THREAD_MIN_FRONTIER:
+                    results = iter(_read_in_threads(repo_path, missing, thread_pool))
+                else:
+                    results = iter(_read_inline(repo_path, missing))
+                next_frontier = []
+                for current_commit, parents in zip(frontier, known_parents):
+                    if parents is None:
+                        parents, message = next(results)
+                        if messages is not None:
+                            messages[current_commit] = message
+                    commit_graph[current_commit] = parents
+                    for parent in parents:
+                        if parent not in visited:
+                            visited.add(parent)
+                            next_frontier.append(parent)
+                frontier = next_frontier
+    finally:
+        if process_pool is not None:
+            process_pool.shutdown()
 
     return commit_graph
 
 
-def generate_plantuml_graph(commit_graph, repo_path):
-    """Генерация PlantUML графа"""
-    plantuml_code = "@startuml\n"
-    for commit, parents in commit_graph.items():
-        _, commit_message = get_commit_data(repo_path, commit)
-        commit_message = "".join(commit_message.split())
+def generate_plantuml_graph(commit_graph, repo_path, messages=None):
+    """Генерация PlantUML графа
 
-        for parent in parents:
-            _, parent_message = get_commit_data(repo_path, parent)
-            parent_message = "".join(parent_message.split())
+    messages - сообщения коммитов, собранные get_commit_graph; недостающие
+    читаются из репозитория.
+    """
+    messages = messages or {}
+    # Имена участников вычисляются один раз на коммит, а не на каждое ребро
+    nodes = dict.fromkeys(
+        node for commit, parents in commit_graph.items() for node in (commit, *parents)
+    )
+    clean_msg = {}
+    for node in nodes:
+        message = messages.get(node)
+        if message is None:
+            _, message = get_commit_data(repo_path, node)
+        clean_msg[node] = "".join(message.split())
 
-            plantuml_code += f'participant {parent_message} as {parent}\n'
-            plantuml_code += f'participant {commit_message} as {commit}\n'
-            plantuml_code += f'"{parent}" --> "{commit}"\n'
+    parts = ["@startuml"]
+    parts.extend(f'participant {message} as {node}' for node, message in clean_msg.items())
+    for commit, parents in commit_graph.items():
+        for parent in parents:
+            parts.append(f'"{parent}" --> "{commit}"')
 
-    plantuml_code += "@enduml"
-    return plantuml_code
+    parts.append("@enduml")
+    return "\n".join(parts)
 
 
 def save_plantuml_code(plantuml_code, output_file):
     """Сохранение PlantUML кода в файл"""
-    with open(output_file, "w") as file:
+    if isinstance(plantuml_code, str):
+        plantuml_code = plantuml_code.encode("utf-8")
+    with open(output_file, "wb") as file:
         file.write(plantuml_code)
 
 
@@ -89,10 +481,11 @@ def main(config_file):
     starting_commit_hash = config["starting_commit_hash"]
 
     # Построение графа коммитов
-    commit_graph = get_commit_graph(repo_path, starting_commit_hash)
+    messages = {}
+    commit_graph = get_commit_graph(repo_path, starting_commit_hash, messages)
 
     # Генерация PlantUML кода
-    plantuml_code = generate_plantuml_graph(commit_graph, repo_path)
+    plantuml_code = generate_plantuml_graph(commit_graph, repo_path, messages)
 
     # Сохранение кода в файл
     save_plantuml_code(plantuml_code, "graph.puml")
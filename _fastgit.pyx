@@ -0,0 +1,52 @@
+# cython: language_level=3
+"""Разбор объектов коммитов Git на Cython (необязательное ускорение для Script2)"""
+
+from libc.string cimport memcmp
+
+
+cdef inline bint _is_hex(unsigned char c):
+    return (48 <= c <= 57) or (97 <= c <= 102)
+
+
+cdef inline bint _is_space(unsigned char c):
+    return c == 32 or 9 <= c <= 13
+
+
+cpdef tuple parse_commit(bytes data):
+    """Разбор распакованного объекта коммита на кортеж родителей и сообщение"""
+    cdef const unsigned char* buf = data
+    cdef Py_ssize_t size = len(data)
+    cdef Py_ssize_t start, header_end, parents_end, position, j
+    cdef Py_ssize_t message_start, message_end
+    cdef list parents = []
+
+    # Пропускаем заголовок объекта вида b"commit <size>\x00"
+    start = data.find(b"\x00") + 1
+    header_end = data.find(b"\n\n", start)
+    if header_end < 0:
+        header_end = size
+    # Родители идут сразу после tree, до author
+    parents_end = data.find(b"\nauthor ", start, header_end)
+    if parents_end < 0:
+        parents_end = header_end
+
+    position = start
+    while position < parents_end:
+        if position + 47 <= parents_end and memcmp(buf + position, b"parent ", 7) == 0:
+            j = position + 7
+            while j < position + 47 and _is_hex(buf[j]):
+                j += 1
+            if j == position + 47:
+                parents.append(data[position + 7:position + 47].decode("ascii"))
+        while position < parents_end and buf[position] != 10:
+            position += 1
+        position += 1
+
+    message_start = min(header_end + 2, size)
+    message_end = size
+    while message_start < message_end and _is_space(buf[message_start]):
+        message_start += 1
+    while message_end > message_start and _is_space(buf[message_end - 1]):
+        message_end -= 1
+
+    return tuple(parents), data[message_start:message_end].decode("utf-8", "replace")
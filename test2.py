@@ -1,9 +1,17 @@
+import os
+import subprocess
 import unittest
 import tempfile
 import shutil
+import struct
 from pathlib import Path
 import zlib
 from unittest.mock import patch, mock_open
+import Script2
+try:
+    import _fastgit  # Необязательное расширение на Cython
+except ImportError:
+    _fastgit = None
 from Script2 import (
     load_config,  # Функция для загрузки конфигурации из INI-файла
     read_git_object,  # Чтение объекта Git по хэшу
@@ -11,6 +19,10 @@ from Script2 import (
     get_commit_graph,  # Построение графа коммитов
     generate_plantuml_graph,  # Генерация PlantUML-кода для графа
     save_plantuml_code,  # Сохранение PlantUML-кода в файл
+    parents_fast,  # Родители коммита из файла commit-graph
+    try_load_commit_graph,  # Загрузка файла commit-graph
+    close_pack_files,  # Закрытие отображённых в память pack-файлов
+    close_commit_graph,  # Закрытие отображённого в память файла commit-graph
 )
 
 
@@ -73,6 +85,20 @@ class TestGitTools(unittest.TestCase):
         with open(object_file, "wb") as f:
             f.write(compressed_data)
 
+    def _write_commit(self, commit_hash, parents, message):
+        """Запись распакованного коммита в objects временного репозитория."""
+        commit_data = "tree abcdef1234567890abcdef1234567890abcdef12\n"
+        commit_data += "".join(f"parent {parent}\n" for parent in parents)
+        commit_data += (
+            "author Test Author <test@example.com> 1695584200 +0000\n"
+            "committer Test Author <test@example.com> 1695584200 +0000\n\n"
+            f"{message}\n"
+        )
+        object_dir = self.objects_dir / commit_hash[:2]
+        object_dir.mkdir(exist_ok=True)
+        with open(object_dir / commit_hash[2:], "wb") as f:
+            f.write(zlib.compress(commit_data.encode("utf-8")))
+
     def tearDown(self):
         """Очистка окружения после тестов: удаление временного репозитория."""
         shutil.rmtree(self.repo_dir)
@@ -90,8 +116,124 @@ class TestGitTools(unittest.TestCase):
     def test_read_git_object(self):
         """Тест: Чтение объекта Git из временного репозитория."""
         data = read_git_object(self.repo_dir, self.commit_hash)
-        self.assertIn("Initial commit", data)  # Проверка сообщения коммита
-        self.assertIn(f"parent {self.parent_hash}", data)  # Проверка наличия родителя
+        self.assertIn(b"Initial commit", data)  # Проверка сообщения коммита
+        self.assertIn(f"parent {self.parent_hash}".encode("ascii"), data)  # Проверка наличия родителя
+
+    def test_read_git_object_missing(self):
+        """Тест: Отсутствующий объект приводит к FileNotFoundError."""
+        with self.assertRaises(FileNotFoundError):
+            read_git_object(self.repo_dir, "0" * 40)
+
+    def _make_git_repo(self, name):
+        """Создание настоящего репозитория с тремя коммитами через git."""
+        repo_dir = Path(self.repo_dir) / name
+        env = dict(os.environ, GIT_AUTHOR_NAME="Test", GIT_AUTHOR_EMAIL="test@example.com",
+                   GIT_COMMITTER_NAME="Test", GIT_COMMITTER_EMAIL="test@example.com")
+
+        def git(*args):
+            return subprocess.run(["git", "-C", str(repo_dir), *args], env=env, check=True,
+                                  capture_output=True, text=True).stdout.strip()
+
+        repo_dir.mkdir()
+        git("init", "-q")
+        for i in range(1, 4):
+            (repo_dir / "file.txt").write_text("line\n" * i * 100, encoding="utf-8")
+            git("add", "file.txt")
+            git("commit", "-q", "-m", f"Commit {i}")
+        return repo_dir, git
+
+    @unittest.skipUnless(shutil.which("git"), "git не установлен")
+    def test_read_packed_objects(self):
+        """Тест: Чтение коммитов из pack-файлов после git gc."""
+        repo_dir, git = self._make_git_repo("packed")
+        git("-c", "gc.writeCommitGraph=false", "gc", "-q")
+        head = git("rev-parse", "HEAD")
+        first = git("rev-parse", "HEAD~2")
+
+        try:
+            graph = get_commit_graph(str(repo_dir), head)
+            self.assertEqual(len(graph), 3)
+            self.assertEqual(graph[first], [])
+            self.assertEqual(get_commit_data(str(repo_dir), head)[1], "Commit 3")
+        finally:
+            # Закрываем отображения pack-файлов, иначе на Windows каталог не удалить
+            close_pack_files(str(repo_dir))
+
+    def test_read_git_object_skips_empty_pack_files(self):
+        """Тест: Пустые файлы .idx и .pack не мешают чтению объектов."""
+        pack_dir = self.objects_dir / "pack"
+        pack_dir.mkdir()
+        (pack_dir / "pack-empty.idx").write_bytes(b"")
+        (pack_dir / "pack-empty.pack").write_bytes(b"")
+        try:
+            self.assertIn(b"Initial commit", read_git_object(self.repo_dir, self.commit_hash))
+            with self.assertRaises(FileNotFoundError):
+                read_git_object(self.repo_dir, "0" * 40)
+        finally:
+            close_pack_files(self.repo_dir)
+
+    @unittest.skipUnless(shutil.which("git"), "git не установлен")
+    def test_parents_from_commit_graph_file(self):
+        """Тест: Родители берутся из файла commit-graph без чтения объектов."""
+        repo_dir, git = self._make_git_repo("commit_graph")
+        git("commit-graph", "write", "--reachable")
+        head = git("rev-parse", "HEAD")
+        middle = git("rev-parse", "HEAD~1")
+        first = git("rev-parse", "HEAD~2")
+
+        try:
+            self.assertEqual(parents_fast(str(repo_dir), head), [middle])
+            self.assertEqual(parents_fast(str(repo_dir), first), [])
+            self.assertIsNone(parents_fast(str(repo_dir), self.commit_hash))
+            graph = get_commit_graph(str(repo_dir), head)
+            self.assertEqual(graph, {head: [middle], middle: [first], first: []})
+        finally:
+            close_commit_graph(str(repo_dir))
+
+    def _write_commit_graph_file(self, data):
+        """Запись файла commit-graph во временный репозиторий."""
+        info_dir = self.objects_dir / "info"
+        info_dir.mkdir(exist_ok=True)
+        (info_dir / "commit-graph").write_bytes(data)
+
+    def test_get_commit_graph_with_malformed_commit_graph_file(self):
+        """Тест: Повреждённый commit-graph не мешает обходу по объектам."""
+        expected_graph = {self.commit_hash: [self.parent_hash], self.parent_hash: []}
+        truncated = b"CGPH"
+        # Заголовок и таблица чанков корректны, но OIDF указывает за конец файла
+        past_end = struct.pack(">4sBBBB", b"CGPH", 1, 1, 3, 0) + b"".join(
+            struct.pack(">4sQ", chunk_id, 1 << 20) for chunk_id in (b"OIDF", b"OIDL", b"CDAT", b"\0" * 4)
+        )
+        for data in (truncated, past_end):
+            with self.subTest(data=data[:8]):
+                self._write_commit_graph_file(data)
+                try:
+                    self.assertIsNone(try_load_commit_graph(self.repo_dir))
+                    self.assertEqual(get_commit_graph(self.repo_dir, self.commit_hash), expected_graph)
+                finally:
+                    close_commit_graph(self.repo_dir)
+
+    def test_parents_fast_extra_edges_without_edge_chunk(self):
+        """Тест: Ссылка на EDGE при отсутствии этого чанка даёт None, а не ошибку."""
+        sha = bytes.fromhex(self.commit_hash)
+        oidf = 8 + 4 * 12
+        oidl = oidf + 256 * 4
+        cdat = oidl + 20
+        end = cdat + 36
+        header = struct.pack(">4sBBBB", b"CGPH", 1, 1, 3, 0) + b"".join(
+            struct.pack(">4sQ", chunk_id, offset)
+            for chunk_id, offset in ((b"OIDF", oidf), (b"OIDL", oidl), (b"CDAT", cdat), (b"\0" * 4, end))
+        )
+        fanout = struct.pack(">256I", *(0 if byte < sha[0] else 1 for byte in range(256)))
+        entry = b"\0" * 20 + struct.pack(">IIQ", 0x70000000, 0x80000000, 0)
+        self._write_commit_graph_file(header + fanout + sha + entry)
+        try:
+            self.assertIsNotNone(try_load_commit_graph(self.repo_dir))
+            self.assertIsNone(parents_fast(self.repo_dir, self.commit_hash))
+            graph = get_commit_graph(self.repo_dir, self.commit_hash)
+            self.assertEqual(graph[self.commit_hash], [self.parent_hash])
+        finally:
+            close_commit_graph(self.repo_dir)
 
     def test_get_commit_data(self):
         """Тест: Извлечение данных коммита (родителей и сообщения)."""
@@ -99,6 +241,45 @@ class TestGitTools(unittest.TestCase):
         self.assertEqual(parents, [self.parent_hash])  # Проверка родительского коммита
         self.assertEqual(message, "Initial commit")  # Проверка сообщения коммита
 
+    def test_get_commit_data_with_object_header(self):
+        """Тест: Заголовок объекта вида "commit <size>\\0" отбрасывается при разборе."""
+        body = (
+            f"tree abcdef1234567890abcdef1234567890abcdef12\n"
+            f"parent {self.commit_hash}\n"
+            "author Test Author <test@example.com> 1695584200 +0000\n"
+            "committer Test Author <test@example.com> 1695584200 +0000\n\n"
+            "Headed commit\n"
+        ).encode("utf-8")
+        headed_hash = "00112233445566778899aabbccddeeff00112233"
+        object_dir = self.objects_dir / headed_hash[:2]
+        object_dir.mkdir()
+        with open(object_dir / headed_hash[2:], "wb") as f:
+            f.write(zlib.compress(b"commit %d\x00" % len(body) + body))
+
+        parents, message = get_commit_data(self.repo_dir, headed_hash)
+        self.assertEqual(parents, [self.commit_hash])
+        self.assertEqual(message, "Headed commit")
+
+    @unittest.skipUnless(_fastgit, "расширение _fastgit не собрано")
+    def test_fastgit_parse_commit_matches_python(self):
+        """Тест: Разбор на Cython совпадает с разбором на Python."""
+        body = (
+            f"tree abcdef1234567890abcdef1234567890abcdef12\n"
+            f"parent {self.commit_hash}\n"
+            f"parent {self.parent_hash}\n"
+            "author Test Author <test@example.com> 1695584200 +0000\n"
+            "committer Test Author <test@example.com> 1695584200 +0000\n\n"
+            "  Headed commit\n\nwith body\n"
+        ).encode("utf-8")
+        samples = [
+            read_git_object(self.repo_dir, self.commit_hash),
+            read_git_object(self.repo_dir, self.parent_hash),
+            b"commit %d\x00" % len(body) + body,
+        ]
+        for data in samples:
+            with self.subTest(data=data[:20]):
+                self.assertEqual(_fastgit.parse_commit(data), Script2._parse_commit_py(data))
+
     def test_get_commit_graph(self):
         """
         Тестирует построение графа коммитов.
@@ -111,6 +292,60 @@ class TestGitTools(unittest.TestCase):
         }
         self.assertEqual(graph, expected_graph)  # Граф содержит корректные данные
 
+    def test_get_commit_graph_with_processes(self):
+        """Тест: Построение графа с чтением фронта обхода в дочерних процессах."""
+        messages = {}
+        with patch("Script2._PROCESS_MIN_FRONTIER", 1):
+            graph = get_commit_graph(self.repo_dir, self.commit_hash, messages)
+        expected_graph = {
+            self.commit_hash: [self.parent_hash],
+            self.parent_hash: []
+        }
+        self.assertEqual(graph, expected_graph)
+        # Сообщения из дочерних процессов возвращаются вызывающему, а не в глобальный кэш
+        self.assertEqual(messages, {self.commit_hash: "Initial commit", self.parent_hash: "Parent commit"})
+        with patch("Script2.get_commit_data", side_effect=AssertionError("повторное чтение")):
+            plantuml_code = generate_plantuml_graph(graph, self.repo_dir, messages)
+        self.assertIn(f"participant Initialcommit as {self.commit_hash}", plantuml_code)
+
+    def _walk_merge_recording_readers(self, **thresholds):
+        """Обход истории с ветвлением шириной 2 с записью способа чтения каждого фронта."""
+        merge_hash = "aa" * 20
+        left_hash = "bb" * 20
+        right_hash = "cc" * 20
+        self._write_commit(merge_hash, [left_hash, right_hash], "Merge")
+        self._write_commit(left_hash, [self.commit_hash], "Left")
+        self._write_commit(right_hash, [self.commit_hash], "Right")
+
+        calls = []
+
+        def record(reader_name, original):
+            def wrapper(repo_path, frontier, *pools):
+                calls.append((reader_name, len(frontier)))
+                return original(repo_path, frontier, *pools)
+            return wrapper
+
+        with patch("Script2._THREAD_MIN_FRONTIER", thresholds.get("threads", 16)), \
+                patch("Script2._PROCESS_MIN_FRONTIER", thresholds.get("processes", 1024)), \
+                patch("Script2._read_inline", record("inline", Script2._read_inline)), \
+                patch("Script2._read_in_threads", record("threads", Script2._read_in_threads)), \
+                patch("Script2._read_in_processes", record("processes", Script2._read_in_processes)):
+            graph = get_commit_graph(self.repo_dir, merge_hash)
+
+        self.assertEqual(graph[merge_hash], [left_hash, right_hash])
+        self.assertEqual(graph[self.parent_hash], [])
+        return calls
+
+    def test_get_commit_graph_uses_processes_only_for_wide_frontiers(self):
+        """Тест: Широкий фронт читается в процессах, следующие за ним узкие - без пулов."""
+        calls = self._walk_merge_recording_readers(processes=2)
+        self.assertEqual(calls, [("inline", 1), ("processes", 2), ("inline", 1), ("inline", 1)])
+
+    def test_get_commit_graph_uses_threads_only_for_wide_frontiers(self):
+        """Тест: Пул потоков нужен только широким фронтам, узкие читаются в текущем потоке."""
+        calls = self._walk_merge_recording_readers(threads=2)
+        self.assertEqual(calls, [("inline", 1), ("threads", 2), ("inline", 1), ("inline", 1)])
+
     def test_generate_plantuml_graph(self):
         """Тест: Генерация PlantUML-кода для графа коммитов."""
         graph = {self.commit_hash: [self.parent_hash]}  # Пример графа
@@ -119,6 +354,15 @@ class TestGitTools(unittest.TestCase):
         self.assertIn(self.commit_hash, plantuml_code)  # Проверка на наличие текущего коммита
         self.assertIn(self.parent_hash, plantuml_code)  # Проверка на наличие родительского коммита
 
+    def test_generate_plantuml_graph_declares_participants_once(self):
+        """Тест: Каждый коммит объявляется участником ровно один раз."""
+        graph = get_commit_graph(self.repo_dir, self.commit_hash)
+        plantuml_code = generate_plantuml_graph(graph, self.repo_dir)
+        lines = plantuml_code.split("\n")
+        self.assertEqual(lines.count(f"participant Initialcommit as {self.commit_hash}"), 1)
+        self.assertEqual(lines.count(f"participant Parentcommit as {self.parent_hash}"), 1)
+        self.assertIn(f'"{self.parent_hash}" --> "{self.commit_hash}"', lines)
+
     def test_save_plantuml_code(self):
         """Тест: Сохранение PlantUML-кода в файл."""
         plantuml_code = "@startuml\n@enduml"  # Пример кода